@@ -1,11 +1,30 @@
+import atexit
 import json
+import math
 import os
+import sys
 import logging
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain, islice
 from typing import Dict, List, Optional
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, MessageHandler, Filters
 
+# Prefer orjson for (de)serialization, falling back to the stdlib when it isn't installed
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+except ImportError:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    loads = json.loads
+
 # Enable logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -13,25 +32,191 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Bot token from @BotFather, read from the environment so it never lives in source
+TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
+if not TOKEN:
+    raise SystemExit("TELEGRAM_BOT_TOKEN environment variable is not set")
+
+class Snapshot:
+    """Full JSON image of the tracker data"""
+    def __init__(self, path: str):
+        self.path = path
+    
+    def load(self) -> Dict:
+        """Read the snapshot from disk"""
+        with open(self.path, 'rb') as f:
+            return loads(f.read())
+    
+    def write(self, data: Dict):
+        """Replace the snapshot with the given data"""
+        # Write beside the target and swap it in, so a crash never leaves a half-written snapshot
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(dumps(data))
+            # The log is truncated right after this, so the snapshot must really be on disk
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        
+        # The rename itself is only durable once the directory entry is synced.
+        # Windows can't open a directory this way and doesn't need it.
+        if os.name != 'nt':
+            dir_fd = os.open(os.path.dirname(self.path) or '.', os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+    
+    def dump_pretty(self, data: Dict) -> str:
+        """Render the data as indented JSON for debugging"""
+        return json.dumps(data, indent=4)
+
+class AppendLog:
+    """Append-only JSONL log of the mutations made since the last snapshot"""
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+    
+    def open(self):
+        """Open the long-lived handle used for appending records"""
+        # Buffered, so a short write is retried instead of leaving half a record behind
+        self._fh = open(self.path, 'ab')
+    
+    def close(self):
+        """Close the append handle"""
+        self._fh.close()
+    
+    @property
+    def closed(self) -> bool:
+        """Whether the append handle is unavailable"""
+        return self._fh is None or self._fh.closed
+    
+    def replay(self):
+        """Yield the logged records in the order they were written"""
+        if not os.path.exists(self.path):
+            return
+        # Records are decoded and handed out one line at a time, so memory use
+        # stays flat however long the log gets
+        good_bytes = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Every append ends in a newline, so this is a write cut short by a crash
+                    logger.warning("Dropping incomplete last record in %s", self.path)
+                    break
+                good_bytes += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    record = loads(line)
+                except ValueError as e:
+                    # A damaged line in the middle must not hide the records after it
+                    logger.warning("Skipping undecodable record in %s: %s", self.path, e)
+                    continue
+                yield record
+        
+        if good_bytes < os.path.getsize(self.path):
+            os.truncate(self.path, good_bytes)
+    
+    def append(self, records: List[Dict]):
+        """Write the records as JSON lines in a single call"""
+        self._fh.write(b''.join(dumps(r) + b"\n" for r in records))
+        self._fh.flush()
+    
+    def size(self) -> int:
+        """Number of bytes currently in the log"""
+        return self._fh.tell()
+    
+    def truncate(self):
+        """Drop every record, once they are covered by a snapshot"""
+        self._fh.seek(0)
+        self._fh.truncate()
+
 class TelegramBudgetTracker:
-    def __init__(self, data_file="telegram_budget_data.json"):
+    # Fold the append log into the snapshot once it grows past this many bytes
+    COMPACT_THRESHOLD = 1024 * 1024
+    # Transaction fields; a month bucket keeps one list per field, all in lockstep
+    TX_FIELDS = ('id', 'date', 'amount', 'category', 'type', 'description')
+    
+    def __init__(self, data_file="telegram_budget_data.json", log_file="telegram_budget_data.jsonl"):
         self.data_file = data_file
+        self.log_file = log_file
+        self.snapshot = Snapshot(data_file)
+        self.log = AppendLog(log_file)
         self.categories = {
             'income': ['Salary', 'Freelance', 'Investments', 'Gifts', 'Other Income'],
             'expense': ['Food', 'Transportation', 'Housing', 'Entertainment', 'Healthcare', 'Utilities', 'Shopping', 'Education', 'Other']
         }
+        self._batch_depth = 0  # number of open 'with tracker:' blocks
+        self._pending = []  # records held back until the current batch exits
         self.load_data()
+        self.log.open()
+    
+    def __enter__(self):
+        """Start a batch: log writes are held back until the outermost block exits"""
+        self._batch_depth += 1
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """End the batch and write everything it logged at once"""
+        self._batch_depth -= 1
+        if self._batch_depth:
+            return False
+        # Changes made before an error are already in memory, so persist them regardless
+        pending, self._pending = self._pending, []
+        if pending:
+            self._write(pending)
+        return False
     
     def load_data(self):
-        """Load data from JSON file or initialize empty data structure"""
+        """Load the snapshot (or initialize empty data) and replay the append log on top"""
         if os.path.exists(self.data_file):
             try:
-                with open(self.data_file, 'r') as f:
-                    self.data = json.load(f)
+                self.data = self.snapshot.load()
             except (json.JSONDecodeError, KeyError):
                 self.initialize_data()
         else:
             self.initialize_data()
+        
+        for user_data in self.data['users'].values():
+            self._migrate_user(user_data)
+        
+        for record in self.log.replay():
+            try:
+                self._apply(record)
+            except (KeyError, TypeError, ValueError) as e:
+                # One bad record must not keep the bot from starting
+                logger.warning("Skipping unusable log record %r: %s", record, e)
+    
+    def _migrate_user(self, user_data: Dict):
+        """Prepare a user loaded from a snapshot, upgrading older schemas"""
+        transactions = user_data['transactions']
+        if isinstance(transactions, list):
+            # Group the flat transaction list into per-month buckets
+            buckets = {}
+            for transaction in transactions:
+                buckets.setdefault(transaction['date'][:7], []).append(transaction)
+            user_data['tx_next_id'] = max((t['id'] for t in transactions), default=0) + 1
+            user_data['transactions'] = transactions = buckets
+        
+        if 'goal_next_id' not in user_data:
+            user_data['goal_next_id'] = max((g['id'] for g in user_data['savings_goals']), default=0) + 1
+        
+        for month, bucket in transactions.items():
+            if isinstance(bucket, list):
+                # Buckets used to hold one dict per transaction
+                transactions[month] = bucket = self._to_columns(bucket)
+            else:
+                # Nothing reads timestamps since summaries moved to the monthly aggregates
+                bucket.pop('ts', None)
+            self._share_column_strings(bucket)
+        
+        if 'monthly_stats' not in user_data:
+            self._rebuild_stats(user_data)
+        else:
+            # Category totals come back from disk as plain dicts
+            for stats in chain(user_data['monthly_stats'].values(), [user_data['all_time_stats']]):
+                stats['by_category'] = defaultdict(float, stats['by_category'])
     
     def initialize_data(self):
         """Initialize empty data structure"""
@@ -40,68 +225,216 @@ class TelegramBudgetTracker:
         }
     
     def save_data(self):
-        """Save data to JSON file"""
-        with open(self.data_file, 'w') as f:
-            json.dump(self.data, f, indent=4)
+        """Save a full snapshot of the data to the JSON file"""
+        self.snapshot.write(self.data)
+    
+    def compact(self):
+        """Write a fresh snapshot and empty the append log it now covers"""
+        self.save_data()
+        self.log.truncate()
+        # The snapshot already includes anything a running batch was holding back
+        self._pending.clear()
+    
+    def close(self):
+        """Compact and close the log; safe to call more than once"""
+        if self.log.closed:
+            return
+        self.compact()
+        self.log.close()
+    
+    def _append(self, record: Dict):
+        """Persist a mutation record, or hold it back while inside a batch"""
+        if self._batch_depth:
+            self._pending.append(record)
+        else:
+            self._write([record])
+    
+    def _write(self, records: List[Dict]):
+        """Append records to the log, compacting once it gets large"""
+        self.log.append(records)
+        if self.log.size() > self.COMPACT_THRESHOLD:
+            self.compact()
+    
+    def _apply(self, record: Dict):
+        """Apply a mutation record to the in-memory data"""
+        # Validate first, so a bad record changes nothing, not even by creating its user
+        self._check_record(record)
+        user_data = self.get_user_data(record['user'])
+        op = record['op']
+        
+        # Replay can meet records the snapshot already covers (e.g. after a crash during
+        # compact()); ids below the user's counter have been applied, so skip them
+        if op == 'add_tx':
+            transaction = record['tx']
+            if transaction['id'] < user_data['tx_next_id']:
+                return
+            self._share_strings(transaction)
+            month = transaction['date'][:7]
+            bucket = user_data['transactions'].get(month)
+            if bucket is None:
+                bucket = user_data['transactions'][month] = self._empty_bucket()
+            for field in self.TX_FIELDS:
+                bucket[field].append(transaction[field])
+            user_data['tx_next_id'] = transaction['id'] + 1
+            self._record_stats(user_data, month, transaction['type'], transaction['category'], transaction['amount'])
+            
+            # Update savings if it's income
+            if transaction['type'] == 'income':
+                user_data['total_savings'] += transaction['amount']
+            elif transaction['type'] == 'expense':
+                user_data['total_savings'] -= transaction['amount']
+        
+        elif op == 'set_budget':
+            user_data['budgets'][record['category']] = record['budget']
+        
+        elif op == 'add_goal':
+            if record['goal']['id'] < user_data['goal_next_id']:
+                return
+            user_data['savings_goals'].append(record['goal'])
+            user_data['goal_next_id'] = record['goal']['id'] + 1
     
     def get_user_data(self, user_id: str):
         """Get or create user data"""
         if user_id not in self.data['users']:
             self.data['users'][user_id] = {
-                'transactions': [],
+                'transactions': {},  # "YYYY-MM": {field: [values for that month's transactions]}
+                'tx_next_id': 1,
                 'budgets': {},
                 'savings_goals': [],
-                'total_savings': 0.0
+                'goal_next_id': 1,
+                'total_savings': 0.0,
+                'monthly_stats': {},  # "YYYY-MM": {income, expenses, by_category}
+                'all_time_stats': self._empty_stats()
             }
         return self.data['users'][user_id]
     
+    def _check_record(self, record: Dict):
+        """Raise if a mutation record is malformed and can't be applied"""
+        if not isinstance(record['user'], str):
+            raise TypeError(f"invalid user {record['user']!r}")
+        op = record['op']
+        
+        if op == 'add_tx':
+            transaction = record['tx']
+            missing = [field for field in self.TX_FIELDS if field not in transaction]
+            if missing:
+                raise KeyError(f"transaction missing {', '.join(missing)}")
+            if not isinstance(transaction['id'], int):
+                raise TypeError(f"invalid transaction id {transaction['id']!r}")
+            for field in ('date', 'category', 'type'):
+                if not isinstance(transaction[field], str):
+                    raise TypeError(f"invalid transaction {field} {transaction[field]!r}")
+            self._check_amount(transaction['amount'])
+        
+        elif op == 'set_budget':
+            if not isinstance(record['category'], str):
+                raise TypeError(f"invalid budget category {record['category']!r}")
+            self._check_amount(record['budget']['amount'])
+        
+        elif op == 'add_goal':
+            if not isinstance(record['goal']['id'], int):
+                raise TypeError(f"invalid goal id {record['goal']['id']!r}")
+            self._check_amount(record['goal']['target_amount'])
+        
+        else:
+            raise ValueError(f"unknown op {op!r}")
+    
+    @staticmethod
+    def _check_amount(amount):
+        """Reject amounts that can't be summed or survive a JSON round trip"""
+        # orjson writes NaN and infinity as null
+        if not isinstance(amount, (int, float)) or not math.isfinite(amount):
+            raise ValueError(f"invalid amount {amount!r}")
+    
+    def _empty_bucket(self) -> Dict:
+        """Create an empty month bucket with one list per transaction field"""
+        return {field: [] for field in self.TX_FIELDS}
+    
+    def _to_columns(self, transactions: List[Dict]) -> Dict:
+        """Convert a list of transaction dicts into a month bucket"""
+        return {field: [t[field] for t in transactions] for field in self.TX_FIELDS}
+    
+    @staticmethod
+    def _share_strings(transaction: Dict):
+        """Make a transaction's type and category point at one shared string each"""
+        # Decoding gives every record its own copy of these few distinct values
+        transaction['type'] = sys.intern(transaction['type'])
+        transaction['category'] = sys.intern(transaction['category'])
+    
+    @staticmethod
+    def _share_column_strings(bucket: Dict):
+        """Same as _share_strings, for every transaction in a month bucket"""
+        bucket['type'] = list(map(sys.intern, bucket['type']))
+        bucket['category'] = list(map(sys.intern, bucket['category']))
+    
+    @staticmethod
+    def _empty_stats() -> Dict:
+        """Create an empty income/expense aggregate"""
+        return {'income': 0.0, 'expenses': 0.0, 'by_category': defaultdict(float)}
+    
+    def _record_stats(self, user_data: Dict, month: str, transaction_type: str, category: str, amount: float):
+        """Add a transaction to its month's aggregate and to the all-time aggregate"""
+        monthly = user_data['monthly_stats'].setdefault(month, self._empty_stats())
+        
+        for stats in (monthly, user_data['all_time_stats']):
+            if transaction_type == 'income':
+                stats['income'] += amount
+            elif transaction_type == 'expense':
+                stats['expenses'] += amount
+                stats['by_category'][category] += amount
+    
+    def _rebuild_stats(self, user_data: Dict):
+        """Recompute a user's aggregates from their transactions"""
+        user_data['monthly_stats'] = {}
+        user_data['all_time_stats'] = self._empty_stats()
+        for month, bucket in user_data['transactions'].items():
+            for transaction_type, category, amount in zip(bucket['type'], bucket['category'], bucket['amount']):
+                self._record_stats(user_data, month, transaction_type, category, amount)
+    
     def add_transaction(self, user_id: str, amount: float, category: str, transaction_type: str, description: str = ""):
         """Add a new transaction (income or expense)"""
         user_data = self.get_user_data(user_id)
+        now = datetime.now()
         
         transaction = {
-            'id': len(user_data['transactions']) + 1,
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'id': user_data['tx_next_id'],
+            'date': now.isoformat(sep=' ', timespec='seconds'),  # "YYYY-MM-DD HH:MM:SS", as before
             'amount': amount,
             'category': category,
             'type': transaction_type,
             'description': description
         }
         
-        user_data['transactions'].append(transaction)
-        
-        # Update savings if it's income
-        if transaction_type == 'income':
-            user_data['total_savings'] += amount
-        elif transaction_type == 'expense':
-            user_data['total_savings'] -= amount
-        
-        self.save_data()
+        record = {'op': 'add_tx', 'user': user_id, 'tx': transaction}
+        self._apply(record)
+        self._append(record)
         return f"✅ {transaction_type.capitalize()} of ${amount:.2f} added successfully!"
     
     def set_budget(self, user_id: str, category: str, amount: float):
         """Set budget for a specific category"""
-        user_data = self.get_user_data(user_id)
-        user_data['budgets'][category] = {
+        budget = {
             'amount': amount,
-            'set_date': datetime.now().strftime("%Y-%m-%d")
+            'set_date': datetime.now().date().isoformat()
         }
-        self.save_data()
+        record = {'op': 'set_budget', 'user': user_id, 'category': category, 'budget': budget}
+        self._apply(record)
+        self._append(record)
         return f"✅ Budget of ${amount:.2f} set for {category}"
     
     def add_savings_goal(self, user_id: str, name: str, target_amount: float, target_date: str):
         """Add a new savings goal"""
         user_data = self.get_user_data(user_id)
         goal = {
-            'id': len(user_data['savings_goals']) + 1,
+            'id': user_data['goal_next_id'],
             'name': name,
             'target_amount': target_amount,
             'current_amount': 0.0,
             'target_date': target_date,
-            'created_date': datetime.now().strftime("%Y-%m-%d")
+            'created_date': datetime.now().date().isoformat()
         }
-        user_data['savings_goals'].append(goal)
-        self.save_data()
+        record = {'op': 'add_goal', 'user': user_id, 'goal': goal}
+        self._apply(record)
+        self._append(record)
         return f"✅ Savings goal '{name}' added successfully!"
     
     def get_financial_summary(self, user_id: str, period: str = "current_month") -> Dict:
@@ -110,33 +443,21 @@ class TelegramBudgetTracker:
         now = datetime.now()
         
         if period == "current_month":
-            start_date = datetime(now.year, now.month, 1)
-            end_date = datetime(now.year, now.month + 1, 1) - timedelta(days=1) if now.month < 12 else datetime(now.year + 1, 1, 1) - timedelta(days=1)
+            stats = user_data['monthly_stats'].get(f"{now.year}-{now.month:02d}")
         elif period == "last_month":
-            last_month = now.month - 1 if now.month > 1 else 12
-            year = now.year if now.month > 1 else now.year - 1
-            start_date = datetime(year, last_month, 1)
-            end_date = datetime(now.year, now.month, 1) - timedelta(days=1)
+            # Step back one month on a running month count, which handles January without a branch
+            year, month_index = divmod(now.year * 12 + now.month - 2, 12)
+            stats = user_data['monthly_stats'].get(f"{year}-{month_index + 1:02d}")
         else:  # all time
-            start_date = datetime(2000, 1, 1)
-            end_date = datetime(2100, 1, 1)
+            stats = user_data['all_time_stats']
         
-        transactions = user_data['transactions']
-        period_transactions = [
-            t for t in transactions
-            if start_date <= datetime.strptime(t['date'], "%Y-%m-%d %H:%M:%S") <= end_date
-        ]
+        if stats is None:
+            stats = self._empty_stats()
         
-        total_income = sum(t['amount'] for t in period_transactions if t['type'] == 'income')
-        total_expenses = sum(t['amount'] for t in period_transactions if t['type'] == 'expense')
+        total_income = stats['income']
+        total_expenses = stats['expenses']
         net_savings = total_income - total_expenses
-        
-        # Calculate expenses by category
-        expenses_by_category = {}
-        for t in period_transactions:
-            if t['type'] == 'expense':
-                category = t['category']
-                expenses_by_category[category] = expenses_by_category.get(category, 0) + t['amount']
+        expenses_by_category = dict(stats['by_category'])
         
         # Check budget compliance
         budget_alerts = []
@@ -159,22 +480,30 @@ class TelegramBudgetTracker:
     def view_transactions(self, user_id: str, limit: int = 10):
         """View recent transactions"""
         user_data = self.get_user_data(user_id)
-        transactions = user_data['transactions'][-limit:]
+        buckets = user_data['transactions']
+        
+        # Walk the months newest first without copying any bucket, stopping after `limit` transactions
+        newest_first = (
+            dict(zip(self.TX_FIELDS, row))
+            for month in sorted(buckets, reverse=True)
+            for row in zip(*(reversed(buckets[month][field]) for field in self.TX_FIELDS))
+        )
+        transactions = list(islice(newest_first, limit))
         
         if not transactions:
             return "No transactions found."
         
-        message = "📋 Recent Transactions:\n\n"
-        for t in reversed(transactions):
+        parts = ["📋 Recent Transactions:\n\n"]
+        for t in transactions:
             emoji = "💰" if t['type'] == 'income' else "💸"
-            message += f"{emoji} {t['date'][:10]}\n"
-            message += f"   {t['type'].title()}: {t['category']}\n"
-            message += f"   Amount: ${t['amount']:.2f}\n"
+            parts.append(f"{emoji} {t['date'][:10]}\n")
+            parts.append(f"   {t['type'].title()}: {t['category']}\n")
+            parts.append(f"   Amount: ${t['amount']:.2f}\n")
             if t['description']:
-                message += f"   Note: {t['description']}\n"
-            message += "\n"
+                parts.append(f"   Note: {t['description']}\n")
+            parts.append("\n")
         
-        return message
+        return ''.join(parts)
     
     def view_savings_goals(self, user_id: str):
         """View all savings goals and progress"""
@@ -184,18 +513,18 @@ class TelegramBudgetTracker:
         if not goals:
             return "No savings goals set."
         
-        message = "🎯 Savings Goals:\n\n"
+        parts = ["🎯 Savings Goals:\n\n"]
         for goal in goals:
             progress = (goal['current_amount'] / goal['target_amount']) * 100 if goal['target_amount'] > 0 else 0
             progress_bar = self._create_progress_bar(progress)
             
-            message += f"🏁 {goal['name']}\n"
-            message += f"   Target: ${goal['target_amount']:.2f}\n"
-            message += f"   Saved: ${goal['current_amount']:.2f}\n"
-            message += f"   Progress: {progress_bar}\n"
-            message += f"   Due: {goal['target_date']}\n\n"
+            parts.append(f"🏁 {goal['name']}\n")
+            parts.append(f"   Target: ${goal['target_amount']:.2f}\n")
+            parts.append(f"   Saved: ${goal['current_amount']:.2f}\n")
+            parts.append(f"   Progress: {progress_bar}\n")
+            parts.append(f"   Due: {goal['target_date']}\n\n")
         
-        return message
+        return ''.join(parts)
     
     def _create_progress_bar(self, progress: float, length: int = 10) -> str:
         """Create a visual progress bar"""
@@ -205,11 +534,35 @@ class TelegramBudgetTracker:
 
 # Initialize the tracker
 tracker = TelegramBudgetTracker()
+atexit.register(tracker.close)
 
-# Telegram Bot Functions
-def start(update, context):
-    """Send welcome message when the command /start is issued."""
-    welcome_text = """
+# Category menus never change while the bot runs, so build them once
+INCOME_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton(category, callback_data=f"income_{category}")]
+    for category in tracker.categories['income']
+])
+EXPENSE_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton(category, callback_data=f"expense_{category}")]
+    for category in tracker.categories['expense']
+])
+BUDGET_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton(category, callback_data=f"budget_{category}")]
+    for category in tracker.categories['expense']
+])
+GOALS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Add New Goal", callback_data="add_goal")],
+    [InlineKeyboardButton("📈 Update Goal Progress", callback_data="update_goal")]
+])
+
+# Prompts shown once a category is picked, keyed by the callback data prefix
+CATEGORY_PROMPTS = {
+    'income': "💵 Adding {} income\n\nPlease enter the amount:",
+    'expense': "💸 Adding {} expense\n\nPlease enter the amount:",
+    'budget': "📊 Setting budget for {}\n\nPlease enter the budget amount:",
+}
+
+# Static replies for /start and /help
+WELCOME_TEXT = """
 💰 *Welcome to Your Personal Budget Tracker Bot!* 💰
 
 I'll help you track your income, expenses, and savings goals. Here's what you can do:
@@ -226,11 +579,8 @@ I'll help you track your income, expenses, and savings goals. Here's what you ca
 
 Let's get your finances organized! 💪
     """
-    update.message.reply_text(welcome_text, parse_mode='Markdown')
 
-def help_command(update, context):
-    """Send help message when the command /help is issued."""
-    help_text = """
+HELP_TEXT = """
 📖 *Budget Tracker Help*
 
 *Available Commands:*
@@ -252,42 +602,35 @@ def help_command(update, context):
 
 Your data is stored securely and privately! 🔒
     """
-    update.message.reply_text(help_text, parse_mode='Markdown')
+
+# Telegram Bot Functions
+def start(update, context):
+    """Send welcome message when the command /start is issued."""
+    update.message.reply_text(WELCOME_TEXT, parse_mode='Markdown')
+
+def help_command(update, context):
+    """Send help message when the command /help is issued."""
+    update.message.reply_text(HELP_TEXT, parse_mode='Markdown')
 
 def add_income(update, context):
     """Start the process of adding income."""
-    keyboard = []
-    for category in tracker.categories['income']:
-        keyboard.append([InlineKeyboardButton(category, callback_data=f"income_{category}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
     update.message.reply_text(
         "💵 Choose income category:",
-        reply_markup=reply_markup
+        reply_markup=INCOME_MARKUP
     )
 
 def add_expense(update, context):
     """Start the process of adding expense."""
-    keyboard = []
-    for category in tracker.categories['expense']:
-        keyboard.append([InlineKeyboardButton(category, callback_data=f"expense_{category}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
     update.message.reply_text(
         "💸 Choose expense category:",
-        reply_markup=reply_markup
+        reply_markup=EXPENSE_MARKUP
     )
 
 def set_budget(update, context):
     """Start the process of setting a budget."""
-    keyboard = []
-    for category in tracker.categories['expense']:
-        keyboard.append([InlineKeyboardButton(category, callback_data=f"budget_{category}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
     update.message.reply_text(
         "📊 Choose category to set budget:",
-        reply_markup=reply_markup
+        reply_markup=BUDGET_MARKUP
     )
 
 def show_summary(update, context):
@@ -295,7 +638,7 @@ def show_summary(update, context):
     user_id = str(update.effective_user.id)
     summary = tracker.get_financial_summary(user_id)
     
-    message = f"""
+    parts = [f"""
 📊 *Financial Summary* ({summary['period'].replace('_', ' ').title()})
 
 *Income & Expenses:*
@@ -303,19 +646,19 @@ def show_summary(update, context):
 💸 Total Expenses: ${summary['total_expenses']:.2f}
 📈 Net Savings: ${summary['net_savings']:.2f}
 💼 Total Savings: ${summary['total_savings']:.2f}
-    """
+    """]
     
     if summary['expenses_by_category']:
-        message += "\n*Expenses by Category:*\n"
+        parts.append("\n*Expenses by Category:*\n")
         for category, amount in summary['expenses_by_category'].items():
-            message += f"  • {category}: ${amount:.2f}\n"
+            parts.append(f"  • {category}: ${amount:.2f}\n")
     
     if summary['budget_alerts']:
-        message += "\n*🚨 Budget Alerts:*\n"
+        parts.append("\n*🚨 Budget Alerts:*\n")
         for alert in summary['budget_alerts']:
-            message += f"  {alert}\n"
+            parts.append(f"  {alert}\n")
     
-    update.message.reply_text(message, parse_mode='Markdown')
+    update.message.reply_text(''.join(parts), parse_mode='Markdown')
 
 def show_transactions(update, context):
     """Show recent transactions."""
@@ -327,14 +670,7 @@ def show_goals(update, context):
     """Show savings goals."""
     user_id = str(update.effective_user.id)
     message = tracker.view_savings_goals(user_id)
-    
-    keyboard = [
-        [InlineKeyboardButton("➕ Add New Goal", callback_data="add_goal")],
-        [InlineKeyboardButton("📈 Update Goal Progress", callback_data="update_goal")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    update.message.reply_text(message, reply_markup=reply_markup, parse_mode='Markdown')
+    update.message.reply_text(message, reply_markup=GOALS_MARKUP, parse_mode='Markdown')
 
 def button_handler(update, context):
     """Handle button callbacks."""
@@ -344,23 +680,15 @@ def button_handler(update, context):
     user_id = str(update.effective_user.id)
     data = query.data
     
-    if data.startswith('income_'):
-        category = data.replace('income_', '')
-        context.user_data['pending_income'] = {'category': category}
-        query.edit_message_text(f"💵 Adding {category} income\n\nPlease enter the amount:")
+    # Split off only the leading prefix, so an underscore inside a category name survives
+    kind, _, category = data.partition('_')
     
-    elif data.startswith('expense_'):
-        category = data.replace('expense_', '')
-        context.user_data['pending_expense'] = {'category': category}
-        query.edit_message_text(f"💸 Adding {category} expense\n\nPlease enter the amount:")
-    
-    elif data.startswith('budget_'):
-        category = data.replace('budget_', '')
-        context.user_data['pending_budget'] = {'category': category}
-        query.edit_message_text(f"📊 Setting budget for {category}\n\nPlease enter the budget amount:")
+    if kind in CATEGORY_PROMPTS:
+        context.user_data['pending'] = (kind, {'category': category})
+        query.edit_message_text(CATEGORY_PROMPTS[kind].format(category))
     
     elif data == 'add_goal':
-        context.user_data['pending_goal'] = {'step': 'name'}
+        context.user_data['pending'] = ('goal', {'step': 'name'})
         query.edit_message_text("🎯 Let's add a new savings goal!\n\nWhat would you like to call this goal?")
     
     elif data == 'update_goal':
@@ -376,59 +704,76 @@ def button_handler(update, context):
         reply_markup = InlineKeyboardMarkup(keyboard)
         query.edit_message_text("Select goal to update:", reply_markup=reply_markup)
 
+def parse_amount(text: str) -> float:
+    """Parse a money amount typed by the user, refusing nan and infinity."""
+    amount = float(text)
+    if not math.isfinite(amount):
+        raise ValueError(f"invalid amount {text!r}")
+    return amount
+
+def handle_income_amount(update, context, user_id, pending, text):
+    """Record the income amount for the chosen category."""
+    amount = parse_amount(text)
+    result = tracker.add_transaction(user_id, amount, pending['category'], 'income')
+    del context.user_data['pending']
+    update.message.reply_text(result)
+
+def handle_expense_amount(update, context, user_id, pending, text):
+    """Record the expense amount for the chosen category."""
+    amount = parse_amount(text)
+    result = tracker.add_transaction(user_id, amount, pending['category'], 'expense')
+    del context.user_data['pending']
+    update.message.reply_text(result)
+
+def handle_budget_amount(update, context, user_id, pending, text):
+    """Set the budget for the chosen category."""
+    amount = parse_amount(text)
+    result = tracker.set_budget(user_id, pending['category'], amount)
+    del context.user_data['pending']
+    update.message.reply_text(result)
+
+def handle_goal_step(update, context, user_id, pending, text):
+    """Collect the savings goal name, amount and date one message at a time."""
+    step = pending['step']
+    
+    if step == 'name':
+        pending['name'] = text
+        pending['step'] = 'amount'
+        update.message.reply_text("Great! Now enter the target amount:")
+    
+    elif step == 'amount':
+        amount = parse_amount(text)
+        pending['target_amount'] = amount
+        pending['step'] = 'date'
+        update.message.reply_text("Perfect! Now enter the target date (YYYY-MM-DD):")
+    
+    elif step == 'date':
+        target_date = text
+        result = tracker.add_savings_goal(user_id, pending['name'], pending['target_amount'], target_date)
+        del context.user_data['pending']
+        update.message.reply_text(result)
+
+# What the next text message means, keyed by the kind stored in context.user_data['pending']
+PENDING_HANDLERS = {
+    'income': handle_income_amount,
+    'expense': handle_expense_amount,
+    'budget': handle_budget_amount,
+    'goal': handle_goal_step,
+}
+
 def handle_message(update, context):
     """Handle user messages for various inputs."""
+    kind, pending = context.user_data.get('pending', (None, None))
+    handler = PENDING_HANDLERS.get(kind)
+    if handler is None:
+        return
+    
     user_id = str(update.effective_user.id)
     text = update.message.text
     
     try:
-        # Handle income amount
-        if 'pending_income' in context.user_data:
-            amount = float(text)
-            category = context.user_data['pending_income']['category']
-            result = tracker.add_transaction(user_id, amount, category, 'income')
-            del context.user_data['pending_income']
-            update.message.reply_text(result)
-        
-        # Handle expense amount
-        elif 'pending_expense' in context.user_data:
-            amount = float(text)
-            category = context.user_data['pending_expense']['category']
-            result = tracker.add_transaction(user_id, amount, category, 'expense')
-            del context.user_data['pending_expense']
-            update.message.reply_text(result)
-        
-        # Handle budget amount
-        elif 'pending_budget' in context.user_data:
-            amount = float(text)
-            category = context.user_data['pending_budget']['category']
-            result = tracker.set_budget(user_id, category, amount)
-            del context.user_data['pending_budget']
-            update.message.reply_text(result)
-        
-        # Handle savings goal steps
-        elif 'pending_goal' in context.user_data:
-            step = context.user_data['pending_goal']['step']
-            
-            if step == 'name':
-                context.user_data['pending_goal']['name'] = text
-                context.user_data['pending_goal']['step'] = 'amount'
-                update.message.reply_text("Great! Now enter the target amount:")
-            
-            elif step == 'amount':
-                amount = float(text)
-                context.user_data['pending_goal']['target_amount'] = amount
-                context.user_data['pending_goal']['step'] = 'date'
-                update.message.reply_text("Perfect! Now enter the target date (YYYY-MM-DD):")
-            
-            elif step == 'date':
-                target_date = text
-                name = context.user_data['pending_goal']['name']
-                target_amount = context.user_data['pending_goal']['target_amount']
-                
-                result = tracker.add_savings_goal(user_id, name, target_amount, target_date)
-                del context.user_data['pending_goal']
-                update.message.reply_text(result)
+        with tracker:
+            handler(update, context, user_id, pending, text)
     
     except ValueError:
         update.message.reply_text("❌ Please enter a valid number!")
@@ -438,8 +783,7 @@ def handle_message(update, context):
 def main():
     """Start the bot."""
     # Create the Updater and pass it your bot's token.
-    # REPLACE "YOUR_BOT_TOKEN_HERE" WITH YOUR ACTUAL BOT TOKEN
-    updater = Updater("8594331460:AAETxTtfsyXZ6zAxEvQewcApsGRUE8m5gzU", use_context=True)
+    updater = Updater(TOKEN, use_context=True)
 
     # Get the dispatcher to register handlers
     dp = updater.dispatcher
@@ -467,5 +811,8 @@ def main():
     # Run the bot until you press Ctrl-C
     updater.idle()
 
+    # Fold everything logged during this run into the snapshot
+    tracker.close()
+
 if __name__ == '__main__':
     main()
\ No newline at end of file